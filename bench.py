@@ -0,0 +1,266 @@
+# -*- coding: utf-8 -*-
+"""
+بنچمارک توان پردازش dp (درون‌پروسه‌ای)
+
+آپدیت‌های مصنوعی از چند سناریو ساخته و با dp.feed_update پردازش می‌شوند؛ Bot API
+با یک session ساختگی جواب داده می‌شود و دیتابیس یک Postgres محلی است.
+
+  BENCH_DATABASE_URL="postgresql://postgres@localhost/soulsowner_bench"  # دیتابیس دورریختنی!
+  python bench.py [-n 2000] [-c 50] [--api-latency-ms 0] [--only group_chatter,...] [--json out.json]
+
+خروجی برای هر سناریو: آپدیت در ثانیه (تا تمام شدن کارهای پس‌زمینه)، p50/p99 زمان
+feed_update، و در یک اجرای جدا با tracemalloc: اوج بایت‌های تخصیص‌یافته و بایت‌های باقی‌مانده
+به ازای هر آپدیت (حجم به بایت، نه تعداد allocationها).
+"""
+
+import argparse
+import asyncio
+import gc
+import itertools
+import json
+import os
+import sys
+import time
+import tracemalloc
+import typing
+from datetime import datetime, timezone
+from typing import Any, Callable, Dict, List
+
+# main.py در زمان import به این متغیرها نیاز دارد
+if not os.getenv("BENCH_DATABASE_URL"):
+    sys.exit("BENCH_DATABASE_URL is required (use a throwaway database, the bench writes to it)")
+BENCH_ADMIN_ID = 777000001
+os.environ["DATABASE_URL"] = os.environ["BENCH_DATABASE_URL"]
+os.environ.setdefault("BOT_TOKEN", "123456:BENCH-TOKEN")
+os.environ.setdefault("ADMIN_ID", str(BENCH_ADMIN_ID))
+os.environ.setdefault("METRICS_PORT", "0")
+os.environ.setdefault("TRACE_SAMPLE_RATE", "0")
+os.environ.setdefault("SLOW_TRACE_FILE", "")
+
+from aiogram import Bot
+from aiogram.client.session.base import BaseSession
+from aiogram.fsm.context import FSMContext
+from aiogram.fsm.storage.base import StorageKey
+from aiogram.types import CallbackQuery, Chat, Message, MessageId, PhotoSize, Update, User
+
+import main
+
+USER_BASE = 880_000_000
+GROUP_BASE = -1_009_000_000_000
+CALLBACK_DATA = [
+    f"{main.CB_SEC}|bots", f"{main.CB_SEC}|vserv", f"{main.CB_SEC}|free", f"{main.CB_SEC}|souls",
+    f"{main.CB_SOULS}|chat", f"{main.CB_SOULS}|call", f"{main.CB_MAIN}|menu",
+]
+
+# -------------------- Fake Bot API --------------------
+class FakeSession(BaseSession):
+    """به هر متد Bot API بی‌درنگ (یا با تأخیر ثابت) یک پاسخ معتبر برمی‌گرداند."""
+
+    def __init__(self, latency: float = 0.0):
+        super().__init__()
+        self.latency = latency
+        self.calls = 0
+        self._ids = itertools.count(1)
+
+    async def close(self) -> None:
+        pass
+
+    async def stream_content(self, *args, **kwargs):
+        if False:
+            yield b""
+
+    def _message(self, bot: Bot, method) -> Message:
+        chat_id = getattr(method, "chat_id", None) or 0
+        chat_id = chat_id if isinstance(chat_id, int) else 0
+        return Message(
+            message_id=next(self._ids),
+            date=datetime.now(timezone.utc),
+            chat=Chat(id=chat_id, type="private" if chat_id > 0 else "supergroup"),
+            text=getattr(method, "text", None),
+        ).as_(bot)
+
+    async def make_request(self, bot: Bot, method, timeout=None):
+        self.calls += 1
+        if self.latency:
+            await asyncio.sleep(self.latency)
+        rt = method.__returning__
+        if rt is Message:
+            return self._message(bot, method)
+        if rt is MessageId:
+            return MessageId(message_id=next(self._ids))
+        if rt is User:
+            return User(id=bot.id, is_bot=True, first_name="bench", username="bench_bot")
+        args = typing.get_args(rt)
+        if typing.get_origin(rt) is list and args:
+            if args[0] is MessageId:
+                return [MessageId(message_id=next(self._ids)) for _ in getattr(method, "message_ids", [])]
+            if args[0] is Message:
+                return [self._message(bot, method) for _ in getattr(method, "media", [])]
+            return []
+        return True
+
+# -------------------- Synthetic updates --------------------
+_update_ids = itertools.count(1)
+
+def _user(uid: int) -> User:
+    return User(id=uid, is_bot=False, first_name=f"u{uid}", username=f"user{uid}")
+
+def _message(chat: Chat, uid: int, **fields) -> Message:
+    return Message(
+        message_id=next(_update_ids), date=datetime.now(timezone.utc),
+        chat=chat, from_user=_user(uid), **fields,
+    )
+
+def _group(i: int) -> Chat:
+    gid = GROUP_BASE - i % 200
+    return Chat(id=gid, type="supergroup", title=f"bench group {gid}")
+
+def group_chatter(i: int) -> List[Update]:
+    m = _message(_group(i), USER_BASE + i % 5000, text=f"سلام بچه‌ها، پیام شماره‌ی {i} درباره‌ی برنامه‌ی امشب")
+    return [Update(update_id=next(_update_ids), message=m)]
+
+def owner_mentions(i: int) -> List[Update]:
+    m = _message(_group(i), USER_BASE + i % 5000, text=f"مالکش کجاست؟ ({i})")
+    return [Update(update_id=next(_update_ids), message=m)]
+
+def menu_callbacks(i: int) -> List[Update]:
+    uid = USER_BASE + i
+    chat = Chat(id=uid, type="private")
+    cq = CallbackQuery(
+        id=str(next(_update_ids)), from_user=_user(uid), chat_instance="bench",
+        data=CALLBACK_DATA[i % len(CALLBACK_DATA)],
+        message=Message(message_id=next(_update_ids), date=datetime.now(timezone.utc), chat=chat, text="menu"),
+    )
+    return [Update(update_id=next(_update_ids), callback_query=cq)]
+
+def user_relays(i: int) -> List[Update]:
+    uid = USER_BASE + i
+    m = _message(Chat(id=uid, type="private"), uid, text=f"سلام، درخواست شماره‌ی {i} برای ادمین")
+    return [Update(update_id=next(_update_ids), message=m)]
+
+def album_bursts(i: int) -> List[Update]:
+    uid = USER_BASE + i
+    chat = Chat(id=uid, type="private")
+    group_id = f"bench-{uid}"
+    return [
+        Update(update_id=next(_update_ids), message=_message(
+            chat, uid, media_group_id=group_id, caption="آلبوم" if k == 0 else None,
+            photo=[PhotoSize(file_id=f"p{uid}-{k}", file_unique_id=f"u{uid}-{k}", width=90, height=90)],
+        ))
+        for k in range(4)
+    ]
+
+async def _set_relay_state(uids: List[int]):
+    for uid in uids:
+        ctx = FSMContext(storage=main.FSM_STORAGE, key=StorageKey(bot_id=main.bot.id, chat_id=uid, user_id=uid))
+        await ctx.set_state(main.SendToAdmin.waiting_for_text)
+        await ctx.update_data(kind="free")
+
+SCENARIOS: Dict[str, Callable[[int], List[Update]]] = {
+    "group_chatter": group_chatter,
+    "owner_mentions": owner_mentions,
+    "menu_callbacks": menu_callbacks,
+    "user_relays": user_relays,
+    "album_bursts": album_bursts,
+}
+NEEDS_RELAY_STATE = {"user_relays", "album_bursts"}
+
+# -------------------- Runner --------------------
+async def _settle():
+    # تسک‌های spawn‌شده، آلبوم‌های در انتظار و flushهای در حال اجرای AlbumCollector
+    while main._background_tasks or len(main.ALBUMS) or main.ALBUMS._running:
+        await asyncio.gather(*main._background_tasks, *main.ALBUMS._running, return_exceptions=True)
+        await asyncio.sleep(0.01)
+
+async def _run_once(name: str, n: int, concurrency: int, offset: int) -> Dict[str, Any]:
+    build = SCENARIOS[name]
+    if name in NEEDS_RELAY_STATE:
+        await _set_relay_state([USER_BASE + offset + i for i in range(n)])
+    # مثل polling آپدیت‌ها از قبل به bot متصل‌اند تا feed_update دوباره validate نکند
+    batches = [
+        [Update.model_validate(u.model_dump(), context={"bot": main.bot}) for u in build(offset + i)]
+        for i in range(n)
+    ]
+    latencies: List[float] = []
+    sem = asyncio.Semaphore(concurrency)
+
+    async def _feed(updates: List[Update]):
+        async with sem:
+            for upd in updates:
+                start = time.perf_counter()
+                await main.dp.feed_update(main.bot, upd)
+                latencies.append(time.perf_counter() - start)
+
+    gc.collect()
+    start = time.perf_counter()
+    await asyncio.gather(*(_feed(b) for b in batches))
+    await _settle()
+    wall = time.perf_counter() - start
+    latencies.sort()
+    return {
+        "updates": len(latencies),
+        "per_sec": len(latencies) / wall if wall else 0.0,
+        "p50_ms": latencies[len(latencies) // 2] * 1000,
+        "p99_ms": latencies[min(len(latencies) - 1, int(len(latencies) * 0.99))] * 1000,
+    }
+
+async def _run_memory(name: str, n: int, concurrency: int, offset: int) -> Dict[str, Any]:
+    gc.collect()
+    tracemalloc.start()
+    base, _ = tracemalloc.get_traced_memory()
+    tracemalloc.reset_peak()
+    res = await _run_once(name, n, concurrency, offset)
+    gc.collect()
+    current, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return {
+        "peak_bytes": peak - base,
+        "retained_bytes_per_update": (current - base) / max(1, res["updates"]),
+    }
+
+async def run(args) -> Dict[str, Dict[str, Any]]:
+    session = FakeSession(latency=args.api_latency_ms / 1000)
+    session.middleware(main.ApiTimingMiddleware())
+    main.bot.session = session
+    tasks = await main.startup(primary=False, metrics_port=0)
+    results: Dict[str, Dict[str, Any]] = {}
+    offset = 0
+    try:
+        for name in args.only or SCENARIOS:
+            await _run_once(name, min(200, args.n), args.concurrency, offset)   # گرم کردن
+            offset += args.n
+            res = await _run_once(name, args.n, args.concurrency, offset)
+            offset += args.n
+            res.update(await _run_memory(name, min(500, args.n), args.concurrency, offset))
+            offset += args.n
+            results[name] = res
+            print(
+                f"{name:<16} {res['updates']:>7} upd {res['per_sec']:>9.1f}/s "
+                f"p50 {res['p50_ms']:>7.2f}ms p99 {res['p99_ms']:>7.2f}ms "
+                f"peak {res['peak_bytes']:>10d} bytes, retained {res['retained_bytes_per_update']:>8.0f} bytes/upd",
+                flush=True,
+            )
+    finally:
+        await main.shutdown(tasks)
+    return results
+
+def parse_args(argv=None):
+    p = argparse.ArgumentParser(description="In-process dp.feed_update throughput benchmark")
+    p.add_argument("-n", type=int, default=2000, help="updates (or albums) per scenario")
+    p.add_argument("-c", "--concurrency", type=int, default=50, help="updates in flight")
+    p.add_argument("--api-latency-ms", type=float, default=0.0, help="simulated Bot API latency")
+    p.add_argument("--only", type=lambda s: [x for x in s.split(",") if x], default=None,
+                   help="comma separated: " + ",".join(SCENARIOS))
+    p.add_argument("--json", help="write results to this file")
+    args = p.parse_args(argv)
+    unknown = set(args.only or []) - set(SCENARIOS)
+    if unknown:
+        p.error(f"unknown scenarios: {', '.join(sorted(unknown))}")
+    return args
+
+if __name__ == "__main__":
+    args = parse_args()
+    results = asyncio.run(run(args))
+    if args.json:
+        with open(args.json, "w", encoding="utf-8") as f:
+            json.dump(results, f, indent=2)
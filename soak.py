@@ -0,0 +1,382 @@
+# -*- coding: utf-8 -*-
+"""
+Soak test: خود ربات (main.py در حالت polling) در یک پروسه‌ی جدا در برابر یک
+Bot API محلی اجرا می‌شود و ساعت‌ها ترافیک ساختگی می‌گیرد.
+
+Bot API ساختگی getUpdates/sendMessage/copyMessage(s)/sendMediaGroup/deleteMessage(s)/...
+را با تأخیر قابل تنظیم پیاده می‌کند، محدودیت نرخ واقعی تلگرام (هر چت و کلی) را با 429
+اعمال می‌کند و درصدی 429/403 تصادفی هم تزریق می‌کند. در طول اجرا RSS پروسه و
+گیج‌های /metrics (تسک‌های زنده، آلبوم‌های در انتظار، صف لاگ، ...) نمونه‌برداری می‌شوند و در
+پایان اگر رشد حافظه/تسک یا عقب‌ماندن از ترافیک دیده شود با کد 1 خارج می‌شود.
+
+  SOAK_DATABASE_URL="postgresql://postgres@localhost/soulsowner_soak"   # دیتابیس دورریختنی!
+  python soak.py --duration 3h --rate 40 --latency-ms 60 --p429 0.01 --p403 0.02
+"""
+
+import argparse
+import asyncio
+import itertools
+import json
+import os
+import random
+import re
+import signal
+import sys
+import time
+from collections import deque
+from typing import Any, Deque, Dict, List, Optional, Tuple
+
+from aiohttp import ClientSession, ClientTimeout, web
+
+SOAK_TOKEN = "123456:SOAK-TOKEN"
+ADMIN_ID = 777000001
+USER_BASE = 880_000_000
+GROUP_BASE = -1_009_000_000_000
+
+def parse_duration(v: str) -> float:
+    m = re.fullmatch(r"(\d+(?:\.\d+)?)([smh]?)", v.strip())
+    if not m:
+        raise argparse.ArgumentTypeError(f"bad duration: {v}")
+    return float(m.group(1)) * {"": 1, "s": 1, "m": 60, "h": 3600}[m.group(2)]
+
+# -------------------- Fake Bot API --------------------
+SEND_PREFIXES = ("send", "copy", "forward")
+
+class FakeTelegram:
+    """نسخه‌ی حداقلی Bot API با محدودیت نرخ شبیه تلگرام."""
+
+    def __init__(self, latency: float, jitter: float, p429: float, p403: float,
+                 global_limit: int, chat_interval: float):
+        self.latency, self.jitter = latency, jitter
+        self.p429, self.p403 = p429, p403
+        self.global_limit = global_limit
+        self.chat_interval = chat_interval
+        self._updates: Deque[Dict[str, Any]] = deque()
+        self._next_update_id = 1
+        self._new_updates = asyncio.Event()
+        self._msg_ids = itertools.count(1000)
+        self._chat_last: Dict[int, float] = {}
+        self._window: Deque[float] = deque()
+        self.stats: Dict[str, int] = {"calls": 0, "sent": 0, "429": 0, "403": 0, "offered": 0}
+
+    # --- updates queue ---
+    def push(self, update: Dict[str, Any]):
+        update["update_id"] = self._next_update_id
+        self._next_update_id += 1
+        self._updates.append(update)
+        self.stats["offered"] += 1
+        self._new_updates.set()
+
+    @property
+    def backlog(self) -> int:
+        return len(self._updates)
+
+    async def _get_updates(self, params: Dict[str, Any]) -> List[Dict[str, Any]]:
+        offset = int(params.get("offset") or 0)
+        while self._updates and self._updates[0]["update_id"] < offset:
+            self._updates.popleft()
+        if not self._updates:
+            self._new_updates.clear()
+            try:
+                await asyncio.wait_for(self._new_updates.wait(), float(params.get("timeout") or 0))
+            except asyncio.TimeoutError:
+                return []
+        return list(itertools.islice(self._updates, int(params.get("limit") or 100)))
+
+    # --- rate limits / injected errors ---
+    def _throttle(self, chat_id: int) -> Optional[Dict[str, Any]]:
+        now = time.monotonic()
+        while self._window and now - self._window[0] >= 1.0:
+            self._window.popleft()
+        if len(self._window) >= self.global_limit or random.random() < self.p429:
+            return _error(429, "Too Many Requests: retry after 1", retry_after=1)
+        last = self._chat_last.get(chat_id)
+        if last is not None and now - last < self.chat_interval:
+            return _error(429, "Too Many Requests: retry after 1", retry_after=1)
+        if chat_id > 0 and random.random() < self.p403:
+            return _error(403, "Forbidden: bot was blocked by the user")
+        self._window.append(now)
+        self._chat_last[chat_id] = now
+        return None
+
+    def _message(self, chat_id: int, text: Optional[str] = None) -> Dict[str, Any]:
+        chat = {"id": chat_id, "type": "private" if chat_id > 0 else "supergroup"}
+        if chat_id < 0:
+            chat["title"] = f"soak {chat_id}"
+        msg = {"message_id": next(self._msg_ids), "date": int(time.time()), "chat": chat}
+        if text:
+            msg["text"] = text
+        return msg
+
+    async def handle(self, request: web.Request) -> web.Response:
+        method = request.match_info["method"]
+        params: Dict[str, Any] = dict(await request.post()) if request.can_read_body else {}
+        params.update(request.query)
+        self.stats["calls"] += 1
+        if method == "getUpdates":
+            return web.json_response({"ok": True, "result": await self._get_updates(params)})
+        if self.latency or self.jitter:
+            await asyncio.sleep(self.latency + random.random() * self.jitter)
+        chat_id = int(params.get("chat_id") or 0)
+
+        if method.startswith(SEND_PREFIXES):
+            err = self._throttle(chat_id)
+            if err:
+                self.stats[str(err["error_code"])] += 1
+                return web.json_response(err, status=err["error_code"])
+            self.stats["sent"] += 1
+        if method == "getMe":
+            result: Any = {"id": int(SOAK_TOKEN.split(":")[0]), "is_bot": True, "first_name": "soak", "username": "soak_bot"}
+        elif method == "getChat":
+            result = {"id": chat_id, "type": "private" if chat_id > 0 else "supergroup"}
+        elif method == "copyMessage":
+            result = {"message_id": next(self._msg_ids)}
+        elif method == "copyMessages":
+            result = [{"message_id": next(self._msg_ids)} for _ in json.loads(params.get("message_ids") or "[]")]
+        elif method == "sendMediaGroup":
+            result = [self._message(chat_id) for _ in json.loads(params.get("media") or "[]")]
+        elif method.startswith(("send", "forward")):
+            result = self._message(chat_id, params.get("text"))
+        else:
+            result = True   # answerCallbackQuery, deleteMessage(s), editMessage*, ...
+        return web.json_response({"ok": True, "result": result})
+
+def _error(code: int, description: str, retry_after: Optional[int] = None) -> Dict[str, Any]:
+    err: Dict[str, Any] = {"ok": False, "error_code": code, "description": description}
+    if retry_after is not None:
+        err["parameters"] = {"retry_after": retry_after}
+    return err
+
+# -------------------- Traffic --------------------
+class Traffic:
+    """ترافیک ترکیبی: گپ گروهی، اشاره به مالک، منوی پی‌وی، پیام/آلبوم به ادمین و گاهی broadcast."""
+
+    def __init__(self, api: FakeTelegram, users: int, groups: int):
+        self.api = api
+        self.users = users
+        self.groups = groups
+        self._ids = itertools.count(1)
+        self._flows: set = set()
+
+    def _user(self, uid: int) -> Dict[str, Any]:
+        return {"id": uid, "is_bot": False, "first_name": f"u{uid}", "username": f"user{uid}"}
+
+    def _message(self, chat: Dict[str, Any], uid: int, **fields) -> Dict[str, Any]:
+        return {"message_id": next(self._ids), "date": int(time.time()), "chat": chat, "from": self._user(uid), **fields}
+
+    def _private(self, uid: int, **fields):
+        self.api.push({"message": self._message({"id": uid, "type": "private"}, uid, **fields)})
+
+    def _callback(self, uid: int, data: str):
+        chat = {"id": uid, "type": "private"}
+        self.api.push({"callback_query": {
+            "id": str(next(self._ids)), "from": self._user(uid), "chat_instance": "soak", "data": data,
+            "message": {"message_id": next(self._ids), "date": int(time.time()), "chat": chat, "text": "menu"},
+        }})
+
+    def group_message(self, text: str):
+        gid = GROUP_BASE - random.randrange(self.groups)
+        chat = {"id": gid, "type": "supergroup", "title": f"soak {gid}"}
+        self.api.push({"message": self._message(chat, USER_BASE + random.randrange(self.users), text=text)})
+
+    async def private_flow(self, album: bool):
+        uid = USER_BASE + random.randrange(self.users)
+        self._private(uid, text="/start")
+        await asyncio.sleep(random.uniform(0.5, 3))
+        section = random.choice(["bots", "vserv", "free"])
+        self._callback(uid, f"sec|{section}")
+        await asyncio.sleep(random.uniform(0.5, 3))
+        self._callback(uid, f"act|send|{section}")
+        await asyncio.sleep(random.uniform(1, 5))
+        if album:
+            group_id = f"soak-{next(self._ids)}"
+            for k in range(random.randint(2, 6)):
+                self._private(uid, media_group_id=group_id, photo=[
+                    {"file_id": f"f{group_id}-{k}", "file_unique_id": f"u{group_id}-{k}", "width": 90, "height": 90},
+                ])
+                await asyncio.sleep(random.uniform(0.05, 0.4))
+        else:
+            self._private(uid, text=f"درخواست تست soak شماره‌ی {next(self._ids)}")
+
+    async def broadcast(self):
+        self._private(ADMIN_ID, text="/broadcast")
+        await asyncio.sleep(1)
+        self._private(ADMIN_ID, text=f"اطلاعیه‌ی تست soak {next(self._ids)}")
+
+    def _spawn(self, coro):
+        t = asyncio.create_task(coro)
+        self._flows.add(t)
+        t.add_done_callback(self._flows.discard)
+
+    async def run(self, rate: float, broadcast_every: float, stop: asyncio.Event):
+        next_broadcast = time.monotonic() + broadcast_every if broadcast_every else float("inf")
+        while not stop.is_set():
+            r = random.random()
+            if r < 0.6:
+                self.group_message(f"پیام عادی گروه {next(self._ids)}")
+            elif r < 0.7:
+                self.group_message("مالکش کجاست؟")
+            elif r < 0.93:
+                self._spawn(self.private_flow(album=False))
+            else:
+                self._spawn(self.private_flow(album=True))
+            if time.monotonic() >= next_broadcast:
+                self._spawn(self.broadcast())
+                next_broadcast += broadcast_every
+            await asyncio.sleep(random.expovariate(rate))
+        for t in list(self._flows):
+            t.cancel()
+
+# -------------------- Sampling --------------------
+GAUGES = ("asyncio_tasks", "background_tasks", "album_pending", "msg_log_queue", "deletions_pending",
+          "flood_guard_chats", "broadcast_jobs_running")
+
+def read_rss(pid: int) -> Optional[int]:
+    try:
+        with open(f"/proc/{pid}/status") as f:
+            for line in f:
+                if line.startswith("VmRSS:"):
+                    return int(line.split()[1]) * 1024
+    except OSError:
+        pass
+    return None
+
+async def read_gauges(http: ClientSession, url: str) -> Dict[str, float]:
+    try:
+        async with http.get(url) as resp:
+            text = await resp.text()
+    except Exception:
+        return {}
+    out = {}
+    for line in text.splitlines():
+        name, _, value = line.partition(" ")
+        if name in GAUGES:
+            out[name] = float(value)
+    return out
+
+Sample = Tuple[float, Optional[int], Dict[str, float], Dict[str, int], int]
+
+def evaluate(samples: List[Sample], warmup: float, max_rss_growth: float, max_task_growth: int,
+             max_backlog: int) -> List[str]:
+    steady = [s for s in samples if s[0] >= warmup]
+    if len(steady) < 2:
+        return ["not enough samples after warmup; run longer"]
+    problems = []
+    first, last = steady[0], steady[-1]
+    if first[1] and last[1] and (last[1] - first[1]) / first[1] > max_rss_growth:
+        problems.append(f"RSS grew {first[1] / 2**20:.0f}MiB -> {last[1] / 2**20:.0f}MiB")
+    t0, t1 = first[2].get("asyncio_tasks"), last[2].get("asyncio_tasks")
+    if t0 is not None and t1 is not None and t1 - t0 > max_task_growth:
+        problems.append(f"live asyncio tasks grew {t0:.0f} -> {t1:.0f}")
+    if last[2].get("album_pending", 0) > 50:
+        problems.append(f"{last[2]['album_pending']:.0f} albums still pending")
+    if last[4] > max_backlog:
+        problems.append(f"update backlog {last[4]} (bot is not keeping up)")
+    return problems
+
+# -------------------- Main --------------------
+async def run(args) -> int:
+    api = FakeTelegram(args.latency_ms / 1000, args.jitter_ms / 1000, args.p429, args.p403,
+                       args.global_limit, args.chat_interval)
+    app = web.Application()
+    app.router.add_post("/bot{token}/{method}", api.handle)
+    app.router.add_get("/bot{token}/{method}", api.handle)
+    runner = web.AppRunner(app)
+    await runner.setup()
+    await web.TCPSite(runner, "127.0.0.1", args.api_port).start()
+
+    env = dict(
+        os.environ,
+        BOT_MODE="polling",
+        BOT_TOKEN=SOAK_TOKEN,
+        DATABASE_URL=os.environ["SOAK_DATABASE_URL"],
+        ADMIN_ID=str(ADMIN_ID),
+        TELEGRAM_API_URL=f"http://127.0.0.1:{args.api_port}",
+        METRICS_PORT=str(args.metrics_port),
+        METRICS_HOST="127.0.0.1",
+    )
+    proc = await asyncio.create_subprocess_exec(
+        sys.executable, os.path.join(os.path.dirname(os.path.abspath(__file__)), "main.py"), env=env,
+    )
+    print(f"bot pid {proc.pid}; fake API on :{args.api_port}; metrics on :{args.metrics_port}", flush=True)
+
+    stop = asyncio.Event()
+    loop = asyncio.get_running_loop()
+    for sig in (signal.SIGINT, signal.SIGTERM):
+        try:
+            loop.add_signal_handler(sig, stop.set)
+        except NotImplementedError:
+            pass
+    traffic = Traffic(api, args.users, args.groups)
+    traffic_task = asyncio.create_task(traffic.run(args.rate, args.broadcast_every, stop))
+    samples: List[Sample] = []
+    started = time.monotonic()
+    last_stats = dict(api.stats)
+    metrics_url = f"http://127.0.0.1:{args.metrics_port}/metrics"
+    async with ClientSession(timeout=ClientTimeout(total=5)) as http:
+        while not stop.is_set() and time.monotonic() - started < args.duration:
+            try:
+                await asyncio.wait_for(stop.wait(), args.report)
+            except asyncio.TimeoutError:
+                pass
+            if proc.returncode is not None:
+                print(f"bot exited with {proc.returncode}", flush=True)
+                stop.set()
+                break
+            elapsed = time.monotonic() - started
+            gauges = await read_gauges(http, metrics_url)
+            rss = read_rss(proc.pid)
+            stats = dict(api.stats)
+            samples.append((elapsed, rss, gauges, stats, api.backlog))
+            d = {k: stats[k] - last_stats[k] for k in stats}
+            last_stats = stats
+            print(
+                f"[{elapsed / 60:7.1f}m] in {d['offered'] / args.report:6.1f}/s "
+                f"sent {d['sent'] / args.report:6.1f}/s 429 {d['429']:5d} 403 {d['403']:5d} "
+                f"backlog {api.backlog:6d} rss {(rss or 0) / 2**20:7.1f}MiB "
+                + " ".join(f"{k}={v:.0f}" for k, v in gauges.items()),
+                flush=True,
+            )
+    stop.set()
+    await traffic_task
+    if proc.returncode is None:
+        proc.send_signal(signal.SIGINT)
+        try:
+            await asyncio.wait_for(proc.wait(), 60)
+        except asyncio.TimeoutError:
+            proc.kill()
+    await runner.cleanup()
+
+    problems = evaluate(samples, args.warmup, args.max_rss_growth, args.max_task_growth, args.max_backlog)
+    for p in problems:
+        print(f"FAIL: {p}", flush=True)
+    if not problems:
+        print("OK: no leak or throughput collapse detected", flush=True)
+    return 1 if problems else 0
+
+def parse_args(argv=None):
+    p = argparse.ArgumentParser(description="End-to-end soak test against a local Bot API stand-in")
+    p.add_argument("--duration", type=parse_duration, default=parse_duration("1h"), help="e.g. 90m, 3h")
+    p.add_argument("--rate", type=float, default=20.0, help="incoming updates per second (Poisson)")
+    p.add_argument("--users", type=int, default=5000)
+    p.add_argument("--groups", type=int, default=200)
+    p.add_argument("--broadcast-every", type=parse_duration, default=parse_duration("20m"), help="0 = never")
+    p.add_argument("--latency-ms", type=float, default=50.0)
+    p.add_argument("--jitter-ms", type=float, default=50.0)
+    p.add_argument("--p429", type=float, default=0.005, help="injected 429 probability per send")
+    p.add_argument("--p403", type=float, default=0.01, help="injected 403 probability per private send")
+    p.add_argument("--global-limit", type=int, default=30, help="sends per second before 429")
+    p.add_argument("--chat-interval", type=float, default=1.0, help="min seconds between sends to one chat")
+    p.add_argument("--api-port", type=int, default=8088)
+    p.add_argument("--metrics-port", type=int, default=9109)
+    p.add_argument("--report", type=float, default=30.0, help="seconds between samples")
+    p.add_argument("--warmup", type=parse_duration, default=parse_duration("5m"))
+    p.add_argument("--max-rss-growth", type=float, default=0.3, help="allowed RSS growth after warmup (fraction)")
+    p.add_argument("--max-task-growth", type=int, default=500)
+    p.add_argument("--max-backlog", type=int, default=1000)
+    return p.parse_args(argv)
+
+if __name__ == "__main__":
+    if not os.getenv("SOAK_DATABASE_URL"):
+        sys.exit("SOAK_DATABASE_URL is required (use a throwaway database, the bot writes to it)")
+    sys.exit(asyncio.run(run(parse_args())))